@@ -1,144 +1,219 @@
+import collections
+import functools
+import hashlib
 import json
 import io
+import os
 import re
+import time
 import zipfile
+import zlib
 from datetime import datetime, date, timedelta
 
+import numpy as np
 import pandas as pd
 import streamlit as st
+from PIL import Image, ImageOps
+
+try:
+    import orjson
+except ImportError:  # optional: fall back to stdlib json
+    orjson = None
 
 
 # ----------------------------
 # Helpers
 # ----------------------------
-def load_seed(path="data/demo_seed.json"):
-    with open(path, "r", encoding="utf-8") as f:
-        return json.load(f)
+@st.cache_data(show_spinner=False)
+def _read_seed(path: str, mtime: float):
+    # mtime is only part of the cache key: editing the seed file invalidates it
+    with open(path, "rb") as f:
+        raw = f.read()
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw)
 
 
-def parse_date(s: str) -> date:
-    return datetime.strptime(s, "%Y-%m-%d").date()
+def load_seed(path="data/demo_seed.json"):
+    return _read_seed(path, os.path.getmtime(path))
 
 
-def days_until(d: date) -> int:
-    return (d - date.today()).days
+def now_utc_str() -> str:
+    return time.strftime("%Y-%m-%d %H:%M UTC", time.gmtime())
 
 
-def status_from_expiry(expiry: date, expiring_window_days: int = 30) -> str:
-    du = days_until(expiry)
-    if du < 0:
-        return "EXPIRED"
-    if du <= expiring_window_days:
-        return "EXPIRING"
-    return "VALID"
+@functools.lru_cache(maxsize=4096)
+def parse_date(s: str) -> date:
+    return datetime.strptime(s, "%Y-%m-%d").date()
 
 
-def badge(status: str) -> str:
-    if status == "VALID":
-        return "✅ VALID"
-    if status == "EXPIRING":
-        return "🟠 EXPIRING"
-    if status == "EXPIRED":
-        return "🔴 EXPIRED"
-    if status == "MISSING":
-        return "⚫ MISSING"
-    return status
+STATUS_BADGES = {
+    "VALID": "✅ VALID",
+    "EXPIRING": "🟠 EXPIRING",
+    "EXPIRED": "🔴 EXPIRED",
+    "MISSING": "⚫ MISSING",
+}
+
+
+# Seed field -> display column
+CERT_COLUMNS = {
+    "id": "Certificate ID",
+    "supplier": "Supplier",
+    "material": "Material",
+    "cert_body": "Cert Body",
+    "country": "Country",
+    "issue_date": "Issue Date",
+    "expiry_date": "Expiry Date",
+    "file_name": "File",
+}
+CERT_COLUMN_ORDER = [
+    "Certificate ID", "Supplier", "Material", "Cert Body", "Country",
+    "Issue Date", "Expiry Date", "Days Until Expiry", "Status", "File"
+]
+# Newest-first session logs are capped so long demo sessions don't grow unbounded
+LOG_MAXLEN = 1000
+
+# Least to most severe; certificate Status is an ordered categorical over these
+STATUS_ORDER = ["VALID", "EXPIRING", "EXPIRED"]
 
 
 def ensure_state(seed):
     if "data" not in st.session_state:
         st.session_state.data = seed
 
+    # Bumped whenever st.session_state.data is mutated (approve / reset)
+    if "data_version" not in st.session_state:
+        st.session_state.data_version = 0
+
     if "approval_log" not in st.session_state:
-        st.session_state.approval_log = []
+        st.session_state.approval_log = collections.deque(maxlen=LOG_MAXLEN)
 
     if "reminder_log" not in st.session_state:
-        st.session_state.reminder_log = []
+        st.session_state.reminder_log = collections.deque(maxlen=LOG_MAXLEN)
 
     # Core intake queues
     if "inbox_submissions" not in st.session_state:
-        st.session_state.inbox_submissions = []  # supplier submitted, pending compliance approval
-
-
-def certificates_df(expiring_window_days: int):
-    certs = st.session_state.data["certificates"]
-    rows = []
-    for c in certs:
-        expiry = parse_date(c["expiry_date"])
-        status = status_from_expiry(expiry, expiring_window_days)
-        rows.append({
-            "Certificate ID": c["id"],
-            "Supplier": c["supplier"],
-            "Material": c["material"],
-            "Cert Body": c["cert_body"],
-            "Country": c["country"],
-            "Issue Date": c["issue_date"],
-            "Expiry Date": c["expiry_date"],
-            "Days Until Expiry": days_until(expiry),
-            "Status": status,
-            "File": c["file_name"]
-        })
-    df = pd.DataFrame(rows)
+        st.session_state.inbox_submissions = collections.deque(maxlen=LOG_MAXLEN)  # supplier submitted, pending compliance approval
+
+    # Bumped whenever inbox_submissions changes (submit / approve / reject / reset)
+    if "inbox_version" not in st.session_state:
+        st.session_state.inbox_version = 0
+
+
+def bump_data_version():
+    st.session_state.data_version += 1
+
+
+def data_snapshot():
+    """
+    Hashable (certificates, suppliers) view of the session data, used as the
+    cache key for the dataframe builders. Only rebuilt when data_version moves.
+    """
+    snap = st.session_state.get("data_snapshot")
+    if snap is None or snap[0] != st.session_state.data_version:
+        data = st.session_state.data
+        snap = (
+            st.session_state.data_version,
+            tuple(tuple(c.items()) for c in data["certificates"]),
+            tuple(tuple(s.items()) for s in data["suppliers"]),
+        )
+        st.session_state.data_snapshot = snap
+    return snap[1], snap[2]
+
+
+def bump_inbox_version():
+    st.session_state.inbox_version += 1
+
+
+def inbox_dataframe() -> pd.DataFrame:
+    """DataFrame view of the compliance inbox, only rebuilt when inbox_version moves."""
+    cached = st.session_state.get("inbox_df_cache")
+    if cached is None or cached[0] != st.session_state.inbox_version:
+        cached = (st.session_state.inbox_version, pd.DataFrame(st.session_state.inbox_submissions))
+        st.session_state.inbox_df_cache = cached
+    return cached[1]
+
+
+@st.cache_data(show_spinner=False)
+def certificates_df(certs_tuple: tuple, expiring_window_days: int, today: date):
+    df = pd.DataFrame([dict(c) for c in certs_tuple])
+    # Day resolution: pandas' default ns timestamps overflow after 2262
+    expiry = df["expiry_date"].to_numpy(dtype="datetime64[D]")
+    days = (expiry - np.datetime64(today, "D")).astype(int)
+    status = np.select(
+        [days < 0, days <= expiring_window_days],
+        ["EXPIRED", "EXPIRING"],
+        default="VALID"
+    )
+    df = df.rename(columns=CERT_COLUMNS).assign(**{"Days Until Expiry": days, "Status": status})
+    df = df[CERT_COLUMN_ORDER]
+    df["Supplier"] = df["Supplier"].astype("category")
+    df["Status"] = pd.Categorical(df["Status"], categories=STATUS_ORDER, ordered=True)
+    df["Status Badge"] = df["Status"].map(STATUS_BADGES)
     df = df.sort_values(by=["Days Until Expiry"], ascending=True, kind="stable")
     return df
 
 
-def supplier_status_df(df_certs: pd.DataFrame):
-    # Supplier status = worst status among their certs
-    order = {"EXPIRED": 3, "EXPIRING": 2, "VALID": 1}
-    inv = {v: k for k, v in order.items()}
+@st.cache_data(show_spinner=False)
+def supplier_status_df(certs_tuple: tuple, suppliers_tuple: tuple, expiring_window_days: int, today: date):
+    # Supplier status = worst status among their certs (Status is ordered, so max() is the worst)
+    df_certs = certificates_df(certs_tuple, expiring_window_days, today)
 
-    sup = []
-    for s in st.session_state.data["suppliers"]:
-        name = s["name"]
-        sub = df_certs[df_certs["Supplier"] == name]
+    worst = df_certs.groupby("Supplier", observed=True).agg(
+        worst=("Status", "max"),
+        days_min=("Days Until Expiry", "min")
+    )
+    sup = pd.DataFrame([dict(s) for s in suppliers_tuple])
+    sup = sup.merge(worst, how="left", left_on="name", right_index=True)
+
+    status = pd.Series(np.where(sup["worst"].isna(), "MISSING", sup["worst"].astype(str)))
+    return pd.DataFrame({
+        "Supplier": sup["name"],
+        "Category": sup["category"],
+        "Country": sup["country"],
+        "Compliance Status": status,
+        "Status Badge": status.map(STATUS_BADGES),
+        "Nearest Expiry (days)": sup["days_min"]
+    })
 
-        if len(sub) == 0:
-            status = "MISSING"
-            days_min = None
-        else:
-            worst = sub["Status"].map(order).max()
-            status = inv[int(worst)]
-            days_min = sub["Days Until Expiry"].min()
 
-        sup.append({
-            "Supplier": name,
-            "Category": s["category"],
-            "Country": s["country"],
-            "Compliance Status": status,
-            "Nearest Expiry (days)": days_min
-        })
-    return pd.DataFrame(sup)
+AUDIT_FIELDS = [
+    "Certificate ID", "Supplier", "Material", "Cert Body", "Country",
+    "Issue Date", "Expiry Date", "Status", "File"
+]
 
 
+# Cached on the selected rows' contents, so reruns with an unchanged selection
+# (unrelated widgets, repeat downloads) skip the rebuild
+@st.cache_data(max_entries=32, show_spinner=False)
 def make_audit_pack_zip(selected_rows: pd.DataFrame) -> bytes:
+    # Build every entry name / body column-wise instead of row by row
+    sel = selected_rows[AUDIT_FIELDS].astype(str)
+    names = (
+        sel["Certificate ID"] + "__"
+        + sel["Supplier"].str.replace(" ", "_") + "__"
+        + sel["Material"].str.replace(" ", "_") + ".txt"
+    )
+    bodies = ""
+    for col in AUDIT_FIELDS:
+        bodies = bodies + f"{col}: " + sel[col] + "\n"
+
     buf = io.BytesIO()
-    with zipfile.ZipFile(buf, mode="w", compression=zipfile.ZIP_DEFLATED) as z:
+    # Entries are a few hundred bytes each: DEFLATE setup dominates and saves
+    # little, so store them as-is (roughly halves build time for big packs)
+    with zipfile.ZipFile(buf, mode="w", compression=zipfile.ZIP_STORED) as z:
         z.writestr(
             "README_AUDIT_PACK.txt",
             "Demo Audit Pack\n\nThis is a demo export. In production, this would include the actual PDF certificates and evidence logs.\n"
         )
-        for _, r in selected_rows.iterrows():
-            fname = f"{r['Certificate ID']}__{r['Supplier'].replace(' ', '_')}__{r['Material'].replace(' ', '_')}.txt"
-            contents = (
-                f"Certificate ID: {r['Certificate ID']}\n"
-                f"Supplier: {r['Supplier']}\n"
-                f"Material: {r['Material']}\n"
-                f"Cert Body: {r['Cert Body']}\n"
-                f"Country: {r['Country']}\n"
-                f"Issue Date: {r['Issue Date']}\n"
-                f"Expiry Date: {r['Expiry Date']}\n"
-                f"Status: {r['Status']}\n"
-                f"File: {r['File']}\n"
-            )
+        for fname, contents in zip(names.tolist(), bodies.tolist()):
             z.writestr(fname, contents)
-    buf.seek(0)
-    return buf.read()
+    return buf.getvalue()
 
 
 def add_approval(action: str, supplier: str, material: str, certificate_id: str, note: str = ""):
-    st.session_state.approval_log.insert(0, {
-        "Time": datetime.utcnow().strftime("%Y-%m-%d %H:%M UTC"),
+    st.session_state.approval_log.appendleft({
+        "Time": now_utc_str(),
         "Action": action,
         "Supplier": supplier,
         "Material": material,
@@ -148,8 +223,8 @@ def add_approval(action: str, supplier: str, material: str, certificate_id: str,
 
 
 def add_reminder(supplier: str, reason: str, channel: str):
-    st.session_state.reminder_log.insert(0, {
-        "Time": datetime.utcnow().strftime("%Y-%m-%d %H:%M UTC"),
+    st.session_state.reminder_log.appendleft({
+        "Time": now_utc_str(),
         "Supplier": supplier,
         "Reason": reason,
         "Channel": channel
@@ -159,6 +234,39 @@ def add_reminder(supplier: str, reason: str, channel: str):
 # ----------------------------
 # "OCR-like" intake simulation
 # ----------------------------
+_DATE_RE = re.compile(
+    r"(?P<y1>20\d{2})[-_/](?P<m1>0[1-9]|1[0-2])[-_/](?P<d1>0[1-9]|[12]\d|3[01])"  # 2026-01-31
+    r"|(?P<d2>0[1-9]|[12]\d|3[01])[-_/](?P<m2>0[1-9]|1[0-2])[-_/](?P<y2>20\d{2})"  # 31-01-2026
+)
+_EXT_RE = re.compile(r"\.[a-zA-Z0-9]+$")
+
+_COUNTRY_MAP = {
+    "uae": "UAE", "dubai": "UAE", "abu": "UAE",
+    "ksa": "KSA", "saudi": "KSA", "riyadh": "KSA",
+    "qatar": "Qatar", "doha": "Qatar",
+    "oman": "Oman", "kuwait": "Kuwait", "bahrain": "Bahrain"
+}
+_COUNTRY_RE = re.compile("|".join(map(re.escape, _COUNTRY_MAP)))
+
+
+@functools.lru_cache(maxsize=1)
+def _supplier_matcher(supplier_names: tuple) -> tuple:
+    """
+    Compiled alternation over the normalized supplier names (lowercase, no
+    spaces) plus a normalized -> canonical name map. Longest names go first
+    so a name that is a prefix of another cannot shadow it.
+    """
+    mapping = {}
+    for s in supplier_names:
+        key = s.lower().replace(" ", "")
+        if key:
+            mapping.setdefault(key, s)
+    if not mapping:
+        return None, mapping
+    pattern = "|".join(re.escape(k) for k in sorted(mapping, key=len, reverse=True))
+    return re.compile(pattern), mapping
+
+
 def guess_from_filename(filename: str, supplier_names: list[str]) -> dict:
     """
     Simulate OCR extraction:
@@ -170,56 +278,44 @@ def guess_from_filename(filename: str, supplier_names: list[str]) -> dict:
     lower = filename.lower()
 
     # Supplier guess
-    supplier_guess = ""
-    for s in supplier_names:
-        if s.lower().replace(" ", "") in lower.replace(" ", ""):
-            supplier_guess = s
-            break
-    if not supplier_guess and supplier_names:
-        supplier_guess = supplier_names[0]
-
-    # Country guess
-    country_map = {
-        "uae": "UAE", "dubai": "UAE", "abu": "UAE",
-        "ksa": "KSA", "saudi": "KSA", "riyadh": "KSA",
-        "qatar": "Qatar", "doha": "Qatar",
-        "oman": "Oman", "kuwait": "Kuwait", "bahrain": "Bahrain"
-    }
-    country_guess = "UAE"
-    for k, v in country_map.items():
-        if k in lower:
-            country_guess = v
-            break
+    supplier_re, supplier_map = _supplier_matcher(tuple(supplier_names))
+    m = supplier_re.search(lower.replace(" ", "")) if supplier_re else None
+    if m:
+        supplier_guess = supplier_map[m.group(0)]
+    else:
+        supplier_guess = supplier_names[0] if supplier_names else ""
+
+    # Country guess (first token in the filename wins)
+    m = _COUNTRY_RE.search(lower)
+    country_guess = _COUNTRY_MAP[m.group(0)] if m else "UAE"
 
     # Expiry date guess (very basic patterns)
-    expiry_guess = date.today() + timedelta(days=365)
-    # pattern 2026-01-31
-    m1 = re.search(r"(20\d{2})[-_/](0[1-9]|1[0-2])[-_/](0[1-9]|[12]\d|3[01])", filename)
-    if m1:
-        y, mo, d = int(m1.group(1)), int(m1.group(2)), int(m1.group(3))
-        try:
-            expiry_guess = date(y, mo, d)
-        except ValueError:
-            pass
-    # pattern 31-01-2026
-    m2 = re.search(r"(0[1-9]|[12]\d|3[01])[-_/](0[1-9]|1[0-2])[-_/](20\d{2})", filename)
-    if m2:
-        d, mo, y = int(m2.group(1)), int(m2.group(2)), int(m2.group(3))
+    # patterns 2026-01-31 / 31-01-2026: the first valid date of each kind is
+    # kept (impossible dates are skipped), and a 31-01-2026 style date beats a
+    # 2026-01-31 one. Caveat: matches don't overlap, so in e.g. 2027-05-15-03-2028
+    # the 2027-05-15 match consumes the digits of 15-03-2028.
+    ymd_guess = dmy_guess = None
+    for m in _DATE_RE.finditer(filename):
         try:
-            expiry_guess = date(y, mo, d)
+            if m["y1"]:
+                if ymd_guess is None:
+                    ymd_guess = date(int(m["y1"]), int(m["m1"]), int(m["d1"]))
+            elif dmy_guess is None:
+                dmy_guess = date(int(m["y2"]), int(m["m2"]), int(m["d2"]))
         except ValueError:
-            pass
+            continue
+    expiry_guess = dmy_guess or ymd_guess or date.today() + timedelta(days=365)
 
     # Material guess (use filename chunks)
-    base = re.sub(r"\.[a-zA-Z0-9]+$", "", filename).replace("_", " ").replace("-", " ")
+    base = _EXT_RE.sub("", filename).replace("_", " ").replace("-", " ")
     tokens = [t for t in base.split() if len(t) > 2]
     material_guess = " ".join(tokens[:4]) if tokens else "Halal Certificate"
 
     # Cert body guess (placeholder)
     cert_body_guess = "Halal Authority (extracted)"
 
-    # Cert number guess (fake-ish but consistent)
-    cert_no_guess = f"HA-{date.today().year}-{abs(hash(filename)) % 10000:04d}"
+    # Cert number guess (fake-ish but consistent; crc32 is stable across processes, hash() is not)
+    cert_no_guess = f"HA-{date.today().year}-{zlib.crc32(filename.encode()) % 10000:04d}"
 
     return {
         "Supplier": supplier_guess,
@@ -231,32 +327,12 @@ def guess_from_filename(filename: str, supplier_names: list[str]) -> dict:
     }
 
 
-def roi_calc_ui():
-    st.subheader("ROI Calculator (Simple)")
-    st.caption("A conservative estimator to explain value in business terms: time + incidents avoided.")
-
-    c1, c2, c3 = st.columns(3)
-
-    with c1:
-        suppliers = st.number_input("Number of suppliers", min_value=5, max_value=2000, value=60, step=5)
-        certs = st.number_input("Number of halal certificates", min_value=10, max_value=20000, value=180, step=10)
-        hourly_cost = st.number_input("Internal cost per hour (USD)", min_value=5, max_value=250, value=25, step=5)
-
-    with c2:
-        chase_hours_week = st.slider("Hours/week chasing suppliers", 0, 60, 6)
-        rework_hours_week = st.slider("Hours/week fixing errors / re-submissions", 0, 60, 3)
-        audit_hours_month = st.slider("Hours/month preparing for audits", 0, 120, 12)
-
-    with c3:
-        delay_incidents_year = st.slider("Shipment / approval delays per year", 0, 24, 2)
-        avg_delay_cost = st.number_input("Avg cost per delay incident (USD)", min_value=0, max_value=500000, value=8000, step=1000)
-        compliance_incidents_year = st.slider("Compliance issues / near-misses per year", 0, 24, 1)
-        avg_compliance_cost = st.number_input("Avg cost per compliance issue (USD)", min_value=0, max_value=500000, value=15000, step=1000)
-
-    st.divider()
-    st.markdown("### Assumptions (kept conservative)")
-    st.write("- Basic reduces admin time modestly; Core reduces chasing and audit prep significantly.")
-
+@st.cache_data(show_spinner=False)
+def _roi_compute(
+    hourly_cost, chase_hours_week, rework_hours_week, audit_hours_month,
+    delay_incidents_year, avg_delay_cost, compliance_incidents_year, avg_compliance_cost
+) -> dict:
+    """Pure ROI arithmetic behind roi_calc_ui; cached so unrelated reruns skip it."""
     basic_time_reduction = 0.20   # 20% reduction in admin time
     core_chase_reduction = 0.70   # 70% less chasing
     core_rework_reduction = 0.45  # 45% less rework
@@ -290,24 +366,94 @@ def roi_calc_ui():
     basic_net = basic_savings - basic_price
     core_net = core_savings - core_price
 
+    return {
+        "baseline_total": baseline_total,
+        "basic_savings": basic_savings,
+        "core_savings": core_savings,
+        "basic_net": basic_net,
+        "core_net": core_net,
+        "basic_payback_months": (basic_price / basic_savings) * 12 if basic_savings > 0 else None,
+        "core_payback_months": (core_price / core_savings) * 12 if core_savings > 0 else None,
+    }
+
+
+PREVIEW_MAX_PX = 1024
+
+
+@st.cache_data(max_entries=16, show_spinner=False)
+def preview_thumbnail(digest: str, _file_bytes: bytes) -> bytes:
+    """
+    Downscaled JPEG preview of an uploaded photo, so large phone pictures are
+    not shipped to the browser on every rerun. Cached on the blake2b digest
+    (_file_bytes itself is not hashed by Streamlit).
+    """
+    im = Image.open(io.BytesIO(_file_bytes))
+    if max(im.size) <= PREVIEW_MAX_PX:
+        return _file_bytes
+    has_alpha = im.mode in ("RGBA", "LA", "PA") or (im.mode == "P" and "transparency" in im.info)
+    im = ImageOps.exif_transpose(im)  # phone photos rely on EXIF rotation, which re-encoding drops
+    if has_alpha:
+        im = im.convert("RGBA")
+    im.thumbnail((PREVIEW_MAX_PX, PREVIEW_MAX_PX))
+    if has_alpha:
+        # JPEG has no alpha: flatten onto white so e.g. black text on a clear scan stays readable
+        flat = Image.new("RGB", im.size, "white")
+        flat.paste(im, mask=im.getchannel("A"))
+        im = flat
+    elif im.mode != "RGB":
+        im = im.convert("RGB")
+    out = io.BytesIO()
+    im.save(out, "JPEG", quality=82, optimize=True)
+    return out.getvalue()
+
+
+def roi_calc_ui():
+    st.subheader("ROI Calculator (Simple)")
+    st.caption("A conservative estimator to explain value in business terms: time + incidents avoided.")
+
+    c1, c2, c3 = st.columns(3)
+
+    with c1:
+        suppliers = st.number_input("Number of suppliers", min_value=5, max_value=2000, value=60, step=5)
+        certs = st.number_input("Number of halal certificates", min_value=10, max_value=20000, value=180, step=10)
+        hourly_cost = st.number_input("Internal cost per hour (USD)", min_value=5, max_value=250, value=25, step=5)
+
+    with c2:
+        chase_hours_week = st.slider("Hours/week chasing suppliers", 0, 60, 6)
+        rework_hours_week = st.slider("Hours/week fixing errors / re-submissions", 0, 60, 3)
+        audit_hours_month = st.slider("Hours/month preparing for audits", 0, 120, 12)
+
+    with c3:
+        delay_incidents_year = st.slider("Shipment / approval delays per year", 0, 24, 2)
+        avg_delay_cost = st.number_input("Avg cost per delay incident (USD)", min_value=0, max_value=500000, value=8000, step=1000)
+        compliance_incidents_year = st.slider("Compliance issues / near-misses per year", 0, 24, 1)
+        avg_compliance_cost = st.number_input("Avg cost per compliance issue (USD)", min_value=0, max_value=500000, value=15000, step=1000)
+
+    st.divider()
+    st.markdown("### Assumptions (kept conservative)")
+    st.write("- Basic reduces admin time modestly; Core reduces chasing and audit prep significantly.")
+
+    roi = _roi_compute(
+        hourly_cost, chase_hours_week, rework_hours_week, audit_hours_month,
+        delay_incidents_year, avg_delay_cost, compliance_incidents_year, avg_compliance_cost
+    )
+
     k1, k2, k3 = st.columns(3)
-    k1.metric("Estimated annual cost today", f"${baseline_total:,.0f}")
-    k2.metric("Estimated savings (Basic)", f"${basic_savings:,.0f}", f"Net after fee: ${basic_net:,.0f}")
-    k3.metric("Estimated savings (Core)", f"${core_savings:,.0f}", f"Net after fee: ${core_net:,.0f}")
+    k1.metric("Estimated annual cost today", f"${roi['baseline_total']:,.0f}")
+    k2.metric("Estimated savings (Basic)", f"${roi['basic_savings']:,.0f}", f"Net after fee: ${roi['basic_net']:,.0f}")
+    k3.metric("Estimated savings (Core)", f"${roi['core_savings']:,.0f}", f"Net after fee: ${roi['core_net']:,.0f}")
 
     st.divider()
     st.markdown("### Payback (months)")
     pb1, pb2 = st.columns(2)
     with pb1:
-        if basic_savings > 0:
-            months = (basic_price / basic_savings) * 12
-            st.write(f"**Basic payback:** ~{months:.1f} months")
+        if roi["basic_payback_months"] is not None:
+            st.write(f"**Basic payback:** ~{roi['basic_payback_months']:.1f} months")
         else:
             st.write("**Basic payback:** N/A")
     with pb2:
-        if core_savings > 0:
-            months = (core_price / core_savings) * 12
-            st.write(f"**Core payback:** ~{months:.1f} months")
+        if roi["core_payback_months"] is not None:
+            st.write(f"**Core payback:** ~{roi['core_payback_months']:.1f} months")
         else:
             st.write("**Core payback:** N/A")
 
@@ -338,23 +484,24 @@ with st.sidebar:
         for k in ["data", "approval_log", "reminder_log", "inbox_submissions"]:
             if k in st.session_state:
                 del st.session_state[k]
+        bump_data_version()
+        bump_inbox_version()
         st.rerun()
 
-# Build dataframes
-df_c = certificates_df(expiring_window)
-df_s = supplier_status_df(df_c)
+# Build dataframes (cached on the data snapshot + window)
+certs_tuple, suppliers_tuple = data_snapshot()
+today = date.today()
+df_c = certificates_df(certs_tuple, expiring_window, today)
+df_s = supplier_status_df(certs_tuple, suppliers_tuple, expiring_window, today)
 
 # KPI row
 k1, k2, k3, k4 = st.columns(4)
-valid = (df_c["Status"] == "VALID").sum()
-expiring = (df_c["Status"] == "EXPIRING").sum()
-expired = (df_c["Status"] == "EXPIRED").sum()
-total = len(df_c)
+counts = df_c["Status"].value_counts()  # one pass; every category is present, even at 0
 
-k1.metric("Certificates", int(total))
-k2.metric("✅ Valid", int(valid))
-k3.metric("🟠 Expiring", int(expiring))
-k4.metric("🔴 Expired", int(expired))
+k1.metric("Certificates", len(df_c))
+k2.metric("✅ Valid", int(counts["VALID"]))
+k3.metric("🟠 Expiring", int(counts["EXPIRING"]))
+k4.metric("🔴 Expired", int(counts["EXPIRED"]))
 
 st.divider()
 
@@ -364,17 +511,14 @@ with left:
     st.subheader("Certificate Vault")
     st.write("All halal documents in one place, sorted by urgency.")
 
-    df_disp = df_c.copy()
-    df_disp["Status Badge"] = df_disp["Status"].apply(badge)
     show_cols = ["Certificate ID", "Supplier", "Material", "Country", "Expiry Date", "Days Until Expiry", "Status Badge", "File"]
-    st.dataframe(df_disp[show_cols], use_container_width=True, hide_index=True)
+    st.dataframe(df_c[show_cols], use_container_width=True, hide_index=True)
 
     st.divider()
     st.subheader("Audit Pack Export (Basic & Core)")
     st.write("Select certificates and export an audit pack (demo ZIP).")
 
-    selectable = df_disp[["Certificate ID", "Supplier", "Material", "Cert Body", "Country", "Issue Date", "Expiry Date", "Status", "File"]].copy()
-    selectable.insert(0, "Select", False)
+    selectable = df_c.assign(Select=False)[["Select"] + AUDIT_FIELDS]
 
     edited = st.data_editor(
         selectable,
@@ -387,11 +531,12 @@ with left:
         key="audit_selector"
     )
 
-    chosen = edited[edited["Select"] == True]
+    mask = edited["Select"].to_numpy(dtype=bool, na_value=False)
+    chosen = edited.loc[mask, AUDIT_FIELDS]
     if len(chosen) == 0:
         st.info("Select 1+ certificates to enable the Audit Pack download.")
     else:
-        zip_bytes = make_audit_pack_zip(chosen.drop(columns=["Select"]))
+        zip_bytes = make_audit_pack_zip(chosen)
         st.download_button(
             "Download Audit Pack (ZIP)",
             data=zip_bytes,
@@ -403,25 +548,27 @@ with right:
     st.subheader("Supplier Compliance View")
     st.write("A simple view: who is compliant vs at-risk.")
 
-    df_s2 = df_s.copy()
-    df_s2["Status Badge"] = df_s2["Compliance Status"].apply(badge)
     st.dataframe(
-        df_s2[["Supplier", "Category", "Country", "Status Badge", "Nearest Expiry (days)"]],
+        df_s[["Supplier", "Category", "Country", "Status Badge", "Nearest Expiry (days)"]],
         use_container_width=True,
         hide_index=True
     )
 
     st.divider()
     st.subheader("Alerts")
-    urgent = df_disp[df_disp["Status"].isin(["EXPIRING", "EXPIRED"])][
+    urgent = df_c[df_c["Status"].isin(["EXPIRING", "EXPIRED"])][
         ["Supplier", "Material", "Expiry Date", "Days Until Expiry", "Status"]
-    ]
+    ].astype(str)
     if len(urgent) == 0:
         st.success("No urgent issues right now.")
     else:
-        for _, r in urgent.iterrows():
-            msg = f"**{r['Supplier']}** — {r['Material']} | Expires **{r['Expiry Date']}** ({int(r['Days Until Expiry'])} days) — **{r['Status']}**"
-            if r["Status"] == "EXPIRED":
+        msgs = (
+            "**" + urgent["Supplier"] + "** — " + urgent["Material"]
+            + " | Expires **" + urgent["Expiry Date"] + "** (" + urgent["Days Until Expiry"]
+            + " days) — **" + urgent["Status"] + "**"
+        )
+        for status, msg in zip(urgent["Status"].tolist(), msgs.tolist()):
+            if status == "EXPIRED":
                 st.error(msg)
             else:
                 st.warning(msg)
@@ -462,7 +609,9 @@ else:
 
             # Optional preview for images
             if intake_file and intake_file.type in ["image/png", "image/jpeg"]:
-                st.image(intake_file, caption="Uploaded photo (demo preview)", use_container_width=True)
+                file_bytes = intake_file.getvalue()
+                digest = hashlib.blake2b(file_bytes, digest_size=16).hexdigest()
+                st.image(preview_thumbnail(digest, file_bytes), caption="Uploaded photo (demo preview)", use_container_width=True)
 
             st.markdown("#### 2) System pre-fills the fields (simulated)")
             if intake_file:
@@ -509,7 +658,7 @@ else:
                     st.stop()
 
                 submission = {
-                    "Submitted": datetime.utcnow().strftime("%Y-%m-%d %H:%M UTC"),
+                    "Submitted": now_utc_str(),
                     "Supplier": vals["Supplier"],
                     "Country": vals["Country"],
                     "Material": vals["Material / Ingredient"],
@@ -520,7 +669,8 @@ else:
                     "State": "PENDING",
                     "Note": note
                 }
-                st.session_state.inbox_submissions.insert(0, submission)
+                st.session_state.inbox_submissions.appendleft(submission)
+                bump_inbox_version()
                 st.success("Submitted. Compliance team can now approve/reject on the right.")
 
         with colB:
@@ -530,8 +680,7 @@ else:
             if len(inbox) == 0:
                 st.info("No pending submissions yet. Upload a certificate on the left to create one.")
             else:
-                inbox_df = pd.DataFrame(inbox)
-                st.dataframe(inbox_df, use_container_width=True, hide_index=True)
+                st.dataframe(inbox_dataframe(), use_container_width=True, hide_index=True)
 
                 st.caption("Approve / Reject the most recent submission (top row).")
                 first = inbox[0]
@@ -551,6 +700,7 @@ else:
                             "status": "VALID",
                             "file_name": first["File"]
                         })
+                        bump_data_version()
                         add_approval(
                             "APPROVED",
                             first["Supplier"],
@@ -558,14 +708,16 @@ else:
                             new_id,
                             f"Approved from supplier intake. CertNo={first.get('Certificate No','')}"
                         )
-                        st.session_state.inbox_submissions.pop(0)
+                        st.session_state.inbox_submissions.popleft()
+                        bump_inbox_version()
                         st.success("Approved and added to Certificate Vault.")
                         st.rerun()
 
                 with c2:
                     if st.button("❌ Reject latest"):
                         add_approval("REJECTED", first["Supplier"], first["Material"], "(pending)", "Rejected (demo)")
-                        st.session_state.inbox_submissions.pop(0)
+                        st.session_state.inbox_submissions.popleft()
+                        bump_inbox_version()
                         st.warning("Rejected. Supplier would be asked to re-submit (demo).")
                         st.rerun()
 
@@ -581,7 +733,7 @@ else:
         st.subheader("Reminder Centre (Demo)")
         st.write("Core automatically chases suppliers for missing/expiring docs. Here it’s simulated.")
 
-        urgent_suppliers = df_disp[df_disp["Status"].isin(["EXPIRING", "EXPIRED"])]["Supplier"].unique().tolist()
+        urgent_suppliers = df_c[df_c["Status"].isin(["EXPIRING", "EXPIRED"])]["Supplier"].unique().tolist()
         if len(urgent_suppliers) == 0:
             st.success("No urgent suppliers to chase today.")
         else: